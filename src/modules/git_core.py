@@ -1,8 +1,18 @@
 #!/usr/bin/python
 
+from atexit import register
+from hashlib import sha1
+from os import environ, listdir, makedirs, path
+from shutil import rmtree
 from subprocess import Popen, PIPE
+from sys import stderr
+from tempfile import mkdtemp
 from modules.git_format import *
 
+origin_connection = {'ssh': None, 'ssh_command': None, 'control_path': None, 'report': False,
+                     'operations': 0, 'handshakes': 0}
+active_plan = {'plan': None}
+
 
 class GitError(Exception):
     def __init__(self, value):
@@ -12,7 +22,16 @@ class GitError(Exception):
         return repr(self.value)
 
 
-def execute(command, return_response=False):
+def execute(command, return_response=False, head_dependent=True):
+    if active_plan['plan'] is not None:
+        return active_plan['plan'].execute(command, return_response, head_dependent)
+    return run_command(command, return_response)
+
+
+def run_command(command, return_response=False):
+    if is_origin_command(command):
+        prepare_origin_connection()
+
     with Popen(command, shell=True, stdout=PIPE, stderr=PIPE) as process:
         try:
             (response, error) = process.communicate()
@@ -27,15 +46,218 @@ def execute(command, return_response=False):
             return format_rows(get_decoded_lines(response))
 
 
+def is_origin_command(command):
+    for origin_command in ORIGIN_COMMANDS:
+        if command.startswith(origin_command):
+            return True
+    return False
+
+
+def prepare_origin_connection():
+    if origin_connection['ssh'] is None:
+        origin_connection['ssh'] = is_ssh_url(get_origin_url())
+        origin_connection['report'] = get_config_option('corvus.sshReport') == 'true'
+        if origin_connection['ssh'] and multiplexing_enabled():
+            start_origin_connection(get_config_option('corvus.sshControlPersist'))
+        if origin_connection['report']:
+            register(print_origin_connection_report)
+
+    origin_connection['operations'] += 1
+    if origin_connection['report'] and origin_connection['ssh'] and not origin_master_running():
+        origin_connection['handshakes'] += 1
+
+
+def multiplexing_enabled():
+    if get_config_option('corvus.sshMultiplexing') == 'false':
+        return False
+    # GIT_SSH names a program, not a command line, so ssh options cannot be appended to it
+    return environ.get('GIT_SSH_COMMAND') is not None or environ.get('GIT_SSH') is None
+
+
+def origin_master_running():
+    control_path = origin_connection['control_path']
+    if control_path is None:
+        return False
+    try:
+        run_command('%s -o ControlPath=%s -O check origin' % (origin_connection['ssh_command'], control_path))
+    except GitError:
+        return False
+    return True
+
+
+def start_origin_connection(control_persist=''):
+    if control_persist == '':
+        control_dir = mkdtemp(prefix='corvus_ssh_')
+        control_path = path.join(control_dir, 'origin')
+        control_persist = SSH_COMMAND_PERSIST
+        register(stop_origin_connection, control_dir)
+    else:
+        origin_hash = sha1(get_origin_url().encode()).hexdigest()[:12]
+        control_path = path.join(get_private_socket_dir(), 'corvus-%s' % origin_hash)
+
+    ssh_command = environ.get('GIT_SSH_COMMAND') or get_config_option('core.sshCommand') or 'ssh'
+    environ['GIT_SSH_COMMAND'] = '%s -o ControlMaster=auto -o ControlPath=%s -o ControlPersist=%s' % (
+        ssh_command, control_path, control_persist)
+    origin_connection['ssh_command'] = ssh_command
+    origin_connection['control_path'] = control_path
+
+
+def get_private_socket_dir():
+    socket_dir = environ.get('XDG_RUNTIME_DIR') or path.expanduser(path.join('~', '.ssh'))
+    makedirs(socket_dir, mode=0o700, exist_ok=True)
+    return socket_dir
+
+
+def stop_origin_connection(control_dir):
+    control_path = origin_connection['control_path']
+    if path.exists(control_path):
+        try:
+            run_command('%s -o ControlPath=%s -O exit origin' % (origin_connection['ssh_command'], control_path))
+        except GitError:
+            pass
+    rmtree(control_dir, ignore_errors=True)
+
+
+def print_origin_connection_report():
+    print(format_origin_connection_report(origin_connection['operations'], origin_connection['handshakes']),
+          file=stderr)
+
+
+def get_origin_url():
+    return run_command('git remote get-url origin', WITH_RESPONSE)
+
+
+def is_ssh_url(url):
+    if url.startswith(('ssh://', 'git+ssh://', 'ssh+git://')):
+        return True
+    if '://' in url or ':' not in url:
+        return False
+    return '/' not in url.split(':')[0]
+
+
 def set_config_options():
     execute('git config --global push.followTags true')
     execute('git config user.name corvus_admin')
 
 
+def enable_large_repo_mode():
+    execute('git config core.fsmonitor true')
+    execute('git config core.untrackedCache true')
+    execute('git config core.splitIndex true')
+    execute('git config index.version 4')
+    execute('git config core.commitGraph true')
+    execute('git config fetch.writeCommitGraph true')
+    update_index_format()
+    start_fsmonitor()
+    write_commit_graph()
+
+
+def update_index_format():
+    execute('git update-index --index-version 4 --untracked-cache --split-index')
+
+
+def start_fsmonitor():
+    try:
+        execute('git fsmonitor--daemon start')
+    except GitError:
+        pass
+
+
+def fsmonitor_running():
+    try:
+        execute('git fsmonitor--daemon status')
+    except GitError:
+        return False
+    return True
+
+
+def write_commit_graph():
+    execute('git commit-graph write --reachable --changed-paths --split')
+
+
+def get_config_option(option):
+    try:
+        return run_command('git config --get %s' % option, WITH_RESPONSE)
+    except GitError:
+        return ''
+
+
+def get_git_path(name):
+    return execute('git rev-parse --git-path %s' % name, WITH_RESPONSE)
+
+
+def get_index_extensions():
+    index_file = get_git_path('index')
+    if not path.isfile(index_file):
+        return 0, []
+
+    hash_size = 32 if execute('git rev-parse --show-object-format', WITH_RESPONSE) == 'sha256' else 20
+    with open(index_file, 'rb') as index:
+        return read_index_extensions(index.read(), hash_size)
+
+
+def read_index_extensions(index, hash_size=20):
+    if index[:4] != b'DIRC':
+        return 0, []
+
+    version = int.from_bytes(index[4:8], 'big')
+    offset = 12
+    for _ in range(int.from_bytes(index[8:12], 'big')):
+        flags = int.from_bytes(index[offset + 40 + hash_size:offset + 42 + hash_size], 'big')
+        name_start = offset + 42 + hash_size + (2 if flags & 0x4000 else 0)
+        if version == 4:
+            while index[name_start] & 0x80:
+                name_start += 1
+            offset = index.index(b'\0', name_start + 1) + 1
+        else:
+            offset += (index.index(b'\0', name_start) - offset + 8) // 8 * 8
+
+    extensions = []
+    end = len(index) - hash_size
+    while offset + 8 <= end:
+        size = int.from_bytes(index[offset + 4:offset + 8], 'big')
+        if offset + 8 + size > end:
+            break
+        extensions.append(index[offset:offset + 4].decode(errors='replace'))
+        offset += 8 + size
+    return version, extensions
+
+
+def get_commit_graph_chunks():
+    graphs_dir = get_git_path('objects/info/commit-graphs')
+    if path.isdir(graphs_dir):
+        graph_files = [path.join(graphs_dir, name) for name in listdir(graphs_dir) if name.endswith('.graph')]
+    else:
+        graph_files = [get_git_path('objects/info/commit-graph')]
+
+    chunks = set()
+    for graph_file in graph_files:
+        if path.isfile(graph_file):
+            chunks.update(read_commit_graph_chunks(graph_file))
+    return chunks
+
+
+def read_commit_graph_chunks(graph_file):
+    with open(graph_file, 'rb') as graph:
+        header = graph.read(8)
+        if header[:4] != b'CGPH':
+            return []
+        lookup_table = graph.read(12 * header[6])
+    return [lookup_table[i:i + 4].decode() for i in range(0, len(lookup_table), 12)]
+
+
 def is_inside_work_tree():
     return execute('git rev-parse --is-inside-work-tree', WITH_RESPONSE)
 
 
+def find_flow_refs():
+    return execute('git for-each-ref --format="%(refname)" refs/heads refs/remotes/origin refs/tags', WITH_RESPONSE)
+
+
+def find_support_branches():
+    return execute('git for-each-ref --format="%(refname:short)" refs/heads/' + SUPPORT, WITH_RESPONSE)
+
+
 def find_branch(branch_name):
     return execute('git for-each-ref --format="%(refname:short)" refs/heads/' +
                    branch_name + ' refs/remotes/origin/' + branch_name, WITH_RESPONSE)
@@ -85,7 +307,7 @@ def uncommited_changes():
 
 
 def update_index():
-    execute('git update -index -q --ignore-submodules --refresh')
+    execute('git update-index -q --ignore-submodules --refresh')
 
 
 def add_tag(tag_name):
@@ -103,7 +325,7 @@ def check_tag_locally(tag_name):
 
 
 def check_tag_remotely(tag_name):
-    return execute('git ls-remote --tags origin' % tag_name, WITH_RESPONSE)
+    return execute('git ls-remote --tags origin %s' % tag_name, WITH_RESPONSE, False)
 
 
 def create_patch(starting_tag, ending_tag, patch_name):
@@ -111,8 +333,39 @@ def create_patch(starting_tag, ending_tag, patch_name):
 
 
 def apply_patch(patch_name):
-    execute('git apply --check %s' % patch_name)
-    execute('git apply -p1 < %s' % patch_name)
+    execute('git apply --index --check %s' % patch_name)
+    execute('git apply --index -p1 < %s' % patch_name)
+    return get_staged_paths()
+
+
+def get_staged_paths():
+    return execute('git diff --cached --name-only --no-renames', WITH_RESPONSE)
+
+
+def add_worktree(path, branch_name):
+    execute('git worktree add %s %s' % (path, branch_name))
+
+
+def remove_worktree(path):
+    execute('git worktree remove --force %s' % path)
+
+
+def fast_forward_worktree(path, branch_name):
+    try:
+        execute('git -C %s rev-parse --verify --quiet refs/remotes/origin/%s' % (path, branch_name))
+    except GitError:
+        return
+    execute('git -C %s merge --ff-only refs/remotes/origin/%s' % (path, branch_name))
+
+
+def apply_patch_in_worktree(path, patch_name):
+    execute('git -C %s apply --index --check %s' % (path, patch_name))
+    execute('git -C %s apply --index -p1 < %s' % (path, patch_name))
+    return execute('git -C %s diff --cached --name-only --no-renames' % path, WITH_RESPONSE)
+
+
+def commit_in_worktree(path, commit_msg):
+    execute('git -C %s commit -m "%s"' % (path, commit_msg))
 
 
 def stage_all_changes():
@@ -123,17 +376,13 @@ def commit(message):
     execute('git commit -m "%s"' % message)
 
 
-def commit_all_changes(commit_msg):
-    stage_all_changes()
-    commit(commit_msg)
-
-
-def get_last_commit_msg_with_substring(message):
-    return execute("git log -1 --pretty=%B --grep=" + message, WITH_RESPONSE)
+def get_last_commit_msg_with_substring(message, branch_name='HEAD'):
+    return execute("git log -1 --pretty=%B --grep=" + message + ' ' + branch_name, WITH_RESPONSE,
+                   branch_name == 'HEAD')
 
 
-def get_last_commit_msg():
-    return execute('git log -1 --pretty=%B', WITH_RESPONSE)
+def get_last_commit_msg(branch_name='HEAD'):
+    return execute('git log -1 --pretty=%B ' + branch_name, WITH_RESPONSE, branch_name == 'HEAD')
 
 
 def revert_commit(sha='HEAD'):
@@ -156,6 +405,14 @@ def push_to_origin(branch_name, upstream=False):
     execute('git push -f origin %s %s' % (branch_name, set_upstream))
 
 
+def push_branches_to_origin(branch_names):
+    execute('git push origin %s' % ' '.join(branch_names))
+
+
+def fetch_from_origin():
+    execute('git fetch origin')
+
+
 def fetch_with_status():
     execute('git fetch')
     return execute('git status', WITH_RESPONSE)
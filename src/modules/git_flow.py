@@ -1,11 +1,16 @@
 #!/usr/bin/python
 
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps
+from os import path
+from shutil import rmtree
+from tempfile import mkdtemp
 from modules.git_validation import *
 from modules.git_core import *
 from modules.git_format import *
 
 
-def start_flow_initialization(version):
+def start_flow_initialization(version, large_repo=False):
     try:
         validate_initialization()
         root_branch = get_current_branch()
@@ -25,6 +30,9 @@ def start_flow_initialization(version):
             push_to_origin(branch, SET_UPSTREAM)
             checkout(root_branch)
 
+        if large_repo:
+            enable_large_repo_mode()
+
         # delete_local_branch(root_branch)
         msg = ['', '  Flow initialization successfully finished.',
                '', '  Set default branch on remote repository to PROD,',
@@ -36,6 +44,101 @@ def start_flow_initialization(version):
         raise ex
 
 
+def maintain_large_repo():
+    update_index_format()
+    start_fsmonitor()
+    write_commit_graph()
+    return large_repo_status()
+
+
+def large_repo_status():
+    (index_version, index_extensions) = get_index_extensions()
+    commit_graph_chunks = get_commit_graph_chunks()
+
+    features = [('fsmonitor', get_config_option('core.fsmonitor') == 'true' and fsmonitor_running()),
+                ('untracked cache', get_config_option('core.untrackedCache') == 'true' and 'UNTR' in index_extensions),
+                ('index v4', index_version == 4),
+                ('split index', 'link' in index_extensions),
+                ('commit-graph', 'CDAT' in commit_graph_chunks),
+                ('changed-path Bloom filters', 'BIDX' in commit_graph_chunks)]
+
+    status = []
+    for (feature, active) in features:
+        status.append('%s: %s' % (feature, 'active' if active else 'inactive'))
+    return format_lines(status)
+
+
+def flow_status(as_json=False):
+    branches = set()
+    tags = set()
+    develop_branch = 'origin/' + DEVELOP
+    for ref in find_flow_refs().splitlines():
+        if ref == 'refs/heads/' + DEVELOP:
+            develop_branch = DEVELOP
+        elif ref.startswith('refs/tags/'):
+            tags.add(ref[len('refs/tags/'):])
+            continue
+
+        for prefix in ['refs/heads/', 'refs/remotes/origin/']:
+            branch_name = ref[len(prefix):]
+            if ref.startswith(prefix) and branch_name.split('/')[0] in [FEATURE, BUGFIX, HOTFIX]:
+                branches.add(branch_name)
+
+    develop_msg = get_last_commit_msg(develop_branch).strip()
+    develop_test = None
+    if is_test_in_progress(develop_msg):
+        develop_test = develop_msg
+
+    status = {
+        'branches': [get_branch_status(branch_name, tags, develop_test) for branch_name in sorted(branches)],
+        'develop': {'test_in_progress': develop_test is not None,
+                    'test': develop_test,
+                    'last_commit': develop_msg},
+        'release': {'approval': get_release_approval(tags)}
+    }
+
+    if as_json:
+        return dumps(status, indent=2)
+    return format_flow_status(status)
+
+
+def get_branch_status(branch_name, tags, develop_test):
+    state = 'unknown'
+    for (tag, tag_state) in [(released_tag(branch_name), 'released'),
+                             (finished_tag(branch_name), 'finished'),
+                             (testing_tag(branch_name), 'testing'),
+                             (started_tag(branch_name), 'started')]:
+        if tag in tags:
+            state = tag_state
+            break
+
+    on_develop = develop_test is not None and develop_test.split('/test')[0] == branch_name
+    return {'branch': branch_name, 'state': state, 'on_develop': on_develop}
+
+
+def get_release_approval(tags):
+    if approval_tag() in tags:
+        return 'approval needed'
+    if overall_approval_tag() in tags:
+        return 'overall approval needed'
+    return 'approved'
+
+
+def format_flow_status(status):
+    rows = []
+    for branch in status['branches']:
+        on_develop = ' (on DEVELOP)' if branch['on_develop'] else ''
+        rows.append('%s: %s%s' % (branch['branch'], branch['state'], on_develop))
+
+    if status['develop']['test_in_progress']:
+        rows.append('DEVELOP: test in progress %s' % status['develop']['test'])
+    else:
+        rows.append('DEVELOP: no test in progress')
+
+    rows.append('RELEASE: %s' % status['release']['approval'])
+    return format_lines(rows)
+
+
 def create_new_bugfix_branch(branch_name):
     return create_flow_branch(branch_name, BUGFIX, STABLE)
 
@@ -80,13 +183,13 @@ def dev_test():
     create_patch(tag_started, tag_testing, patch_name)
 
     checkout(DEVELOP)
-    apply_patch(patch_name)
+    touched_paths = apply_patch(patch_name)
     delete_patch(patch_name)
-    commit_all_changes(test_name)
+    commit(test_name)
     push_to_origin(DEVELOP)
 
     checkout(current_branch)
-    return format_blanks('Test applied on DEVELOP.')
+    return format_rows([format_blanks('Test applied on DEVELOP.'), format_touched_paths(touched_paths)])
 
 
 def end_dev_test_if_hotfix(current_branch):
@@ -101,8 +204,7 @@ def get_test_name(branch_name):
 
 
 def get_test_number(branch_name):
-    checkout(DEVELOP)
-    test = get_last_commit_msg_with_substring(branch_name)
+    test = get_last_commit_msg_with_substring(branch_name, DEVELOP)
     if test == '':
         return '1'
 
@@ -146,7 +248,7 @@ def end_dev_test(reason_of_shutting_down):
     name_of_tested_branch = get_last_commit_msg().rstrip()
     commit_msg = '%s/%s' % (name_of_tested_branch, reason_of_shutting_down)
     revert_commit()
-    commit_all_changes(commit_msg)
+    commit(commit_msg)
     push_to_origin(DEVELOP)
 
 
@@ -180,16 +282,16 @@ def release():
     create_patch(started_tag(current_branch), tag_finished, patch_name)
 
     checkout(RELEASE)
-    apply_patch(patch_name)
+    touched_paths = apply_patch(patch_name)
     delete_patch(patch_name)
-    commit_all_changes('%s' % current_branch)
+    commit('%s' % current_branch)
     add_tag(approval_tag())
     push_to_origin(RELEASE)
 
     checkout(current_branch)
     remove_tag(tag_finished)
     add_tag(tag_released)
-    return format_blanks('Branch successfully released.')
+    return format_rows([format_blanks('Branch successfully released.'), format_touched_paths(touched_paths)])
 
 
 def approve():
@@ -224,7 +326,7 @@ def remove(branch_name):
 
     commit_sha = get_sha_of_commit_with_msg(branch_name)
     revert_commit(commit_sha)
-    commit_all_changes('REMOVED/%s' % branch_name)
+    commit('REMOVED/%s' % branch_name)
     add_tag(overall_approval_tag())
     push_to_origin(RELEASE)
 
@@ -254,7 +356,7 @@ def publish(version):
     add_tag('RELEASE/%s' % version)
 
     checkout(PROD)
-    apply_patch(patch_name)
+    touched_paths = apply_patch(patch_name)
     commit('%s' % version)
 
     # TODO stable
@@ -262,7 +364,98 @@ def publish(version):
     push_to_origin(STABLE)
     push_to_origin(PROD)
 
-    return ''
+    return format_touched_paths(touched_paths)
+
+
+def backport(support_names=None):
+    current_branch = get_current_branch()
+    tag_started = started_tag(current_branch)
+    tag_finished = finished_tag(current_branch)
+    validate_backport(current_branch, tag_finished)
+    support_branches = get_selected_support_branches(support_names)
+
+    patch_name = path.abspath(format_patch_name(current_branch, 'backport'))
+    create_patch(tag_started, tag_finished, patch_name)
+    try:
+        return fan_out_patch(patch_name, current_branch, support_branches)
+    finally:
+        delete_patch(patch_name)
+
+
+def get_selected_support_branches(support_names=None):
+    all_support_branches = find_support_branches().splitlines()
+    if not support_names:
+        support_names = all_support_branches
+
+    support_branches = []
+    for support_name in support_names:
+        support_branch = '%s/%s' % (SUPPORT, branch_identifier(support_name))
+        if support_branch not in all_support_branches:
+            raise GitError('Abort: %s branch does not exist.' % support_branch)
+        support_branches.append(support_branch)
+
+    if len(support_branches) == 0:
+        raise GitError('Abort: There are no SUPPORT branches.')
+    return support_branches
+
+
+def fan_out_patch(patch_name, commit_msg, support_branches):
+    fetch_from_origin()
+    worktrees_root = mkdtemp(prefix='corvus_')
+    jobs = []
+    results = []
+    try:
+        for support_branch in support_branches:
+            worktree = path.join(worktrees_root, branch_identifier(support_branch))
+            try:
+                add_worktree(worktree, support_branch)
+            except GitError as ex:
+                results.append((support_branch, 'failed', ex.value.strip()))
+                continue
+            jobs.append((support_branch, worktree, patch_name, commit_msg))
+
+        with ThreadPoolExecutor() as pool:
+            results.extend(pool.map(apply_patch_on_worktree, jobs))
+    finally:
+        for job in jobs:
+            remove_worktree(job[1])
+        rmtree(worktrees_root, ignore_errors=True)
+
+    applied_branches = [branch for (branch, status, detail) in results if status == 'applied']
+    push_error = None
+    if len(applied_branches) != 0:
+        try:
+            push_branches_to_origin(applied_branches)
+        except GitError as ex:
+            push_error = ex.value.strip()
+
+    return format_fan_out_report(results, push_error)
+
+
+def apply_patch_on_worktree(job):
+    (support_branch, worktree, patch_name, commit_msg) = job
+    try:
+        fast_forward_worktree(worktree, support_branch)
+        touched_paths = apply_patch_in_worktree(worktree, patch_name)
+        commit_in_worktree(worktree, commit_msg)
+    except GitError as ex:
+        return support_branch, 'conflict', ex.value.strip()
+    return support_branch, 'applied', ', '.join(touched_paths.splitlines())
+
+
+def format_fan_out_report(results, push_error=None):
+    report = ['Backport report:']
+    for (support_branch, status, detail) in sorted(results):
+        if status == 'applied':
+            report.append('%s: applied (%s)' % (support_branch, detail))
+        else:
+            reason = detail.splitlines()[0] if detail != '' else 'unknown error'
+            report.append('%s: %s (%s)' % (support_branch, status, reason))
+
+    if push_error is not None:
+        reason = push_error.splitlines()[0] if push_error != '' else 'unknown error'
+        report.append('Push failed (%s)' % reason)
+    return format_lines(report)
 
 
 def prolong_testing_branch():
@@ -13,6 +13,8 @@ STABLE = 'STABLE'
 HISTORY = 'HISTORY'
 MAIN_BRANCHES = [PROD, RELEASE, STABLE, DEVELOP, HISTORY]
 DEVELOP_END_KEYWORDS = ['success', 'failed', 'forced_down']
+ORIGIN_COMMANDS = ['git push', 'git fetch', 'git ls-remote']
+SSH_COMMAND_PERSIST = '30s'
 
 
 def get_decoded_lines(output):
@@ -46,6 +48,14 @@ def format_patch_name(branch_name, type_of_patch):
     return '%s_%s.patch' % (''.join(branch), type_of_patch)
 
 
+def format_touched_paths(paths):
+    return format_lines(['Touched paths:'] + paths.splitlines())
+
+
+def format_origin_connection_report(operations, handshakes):
+    return format_blanks('Origin operations: %s, SSH handshakes: %s' % (operations, handshakes))
+
+
 def format_commit_msg(branch_name, commit_msg):
     commit_msg = branch_name + '/' + commit_msg
     return commit_msg
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+
+from modules.git_core import *
+
+READ = 'read'
+CHECKOUT = 'checkout'
+WRITE = 'write'
+PUSH = 'push'
+FETCH = 'fetch'
+
+READ_COMMANDS = ['git symbolic-ref', 'git rev-parse', 'git describe', 'git log', 'git status',
+                 'git for-each-ref', 'git ls-remote', 'git diff-files', 'git diff-index',
+                 'git config --get', 'git remote get-url', 'git merge HEAD']
+REMOTE_READ_COMMANDS = ['git ls-remote']
+WORKTREE_READ_COMMANDS = ['git diff-files', 'git diff-index', 'git status', 'git merge HEAD']
+OPERATION_COSTS = {READ: 1, CHECKOUT: 5, WRITE: 3, PUSH: 50, FETCH: 50}
+
+
+class GitPlan:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.requested = []
+        self.planned = []
+        self.pending = []
+        self.pushes = []
+        self.responses = {}
+        self.current_branch = None
+        self.head_branch = None
+        self.sequence = 0
+        self.error = None
+        self.failed_at = None
+
+    def execute(self, command, return_response=False, head_dependent=True):
+        if self.error is not None:
+            raise self.error
+
+        kind = operation_kind(command, return_response)
+        self.requested.append((kind, command))
+        self.sequence += 1
+
+        if kind == READ:
+            return self.read(command, return_response, head_dependent)
+        if kind == CHECKOUT:
+            self.plan_checkout(command)
+        elif kind == PUSH:
+            self.pushes.append((self.sequence, command))
+            self.forget_remote_responses()
+        elif kind == FETCH:
+            self.pending.append((self.sequence, kind, command))
+            self.flush(True)
+            self.responses = {}
+        else:
+            self.pending.append((self.sequence, kind, command))
+            self.responses = {}
+
+    def read(self, command, return_response, head_dependent):
+        if command == 'git symbolic-ref --short HEAD' and self.current_branch is not None:
+            return self.current_branch
+
+        key = (self.current_branch, command) if head_dependent else command
+        if key in self.responses:
+            if isinstance(self.responses[key], GitError):
+                raise self.responses[key]
+            return self.responses[key]
+
+        self.flush(is_remote_read(command))
+        if self.dry_run and head_dependent and self.current_branch != self.head_branch:
+            command = read_on_branch(command, self.current_branch)
+        try:
+            response = self.run(READ, command, return_response)
+        except GitError as ex:
+            if self.error is None:
+                self.responses[key] = ex
+            raise ex
+        self.responses[key] = response
+
+        if command == 'git symbolic-ref --short HEAD':
+            self.current_branch = response
+            self.head_branch = response
+        return response
+
+    def plan_checkout(self, command):
+        branch_name = command.split()[2]
+        if branch_name == self.current_branch:
+            return
+
+        if len(self.pending) != 0 and self.pending[-1][1] == CHECKOUT:
+            self.pending.pop()
+        self.pending.append((self.sequence, CHECKOUT, command))
+        self.current_branch = branch_name
+
+    def forget_remote_responses(self):
+        for key in list(self.responses):
+            if is_remote_read(key if isinstance(key, str) else key[1]):
+                del self.responses[key]
+
+    def flush(self, with_pushes=False):
+        (pending, self.pending) = (self.pending, [])
+        for (sequence, kind, command) in pending:
+            if kind == FETCH or command.startswith('git tag'):
+                self.flush_pushes(sequence)
+            self.run(kind, command, sequence=sequence)
+
+        if with_pushes:
+            self.flush_pushes()
+
+    def flush_pushes(self, before=None):
+        pushes = [(sequence, command) for (sequence, command) in self.pushes if before is None or sequence < before]
+        self.pushes = self.pushes[len(pushes):]
+        if len(pushes) == 0:
+            return
+        for command in coalesce_pushes([command for (sequence, command) in pushes]):
+            self.run(PUSH, command, sequence=pushes[0][0])
+
+    def finish(self):
+        if self.error is None:
+            self.flush(True)
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        if self.error is None:
+            try:
+                self.flush()
+            except GitError:
+                pass
+        try:
+            self.flush_pushes(self.failed_at)
+        except GitError:
+            pass
+
+    def run(self, kind, command, return_response=False, sequence=None):
+        self.planned.append((kind, command))
+        if self.dry_run and kind != READ:
+            return None
+
+        try:
+            return run_command(command, return_response)
+        except GitError as ex:
+            if kind != READ:
+                self.error = ex
+                self.failed_at = sequence
+            raise ex
+
+    def describe(self):
+        rows = ['Planned git operations:']
+        for (kind, command) in self.planned:
+            rows.append('%-8s %4s  %s' % (kind, OPERATION_COSTS[kind], command))
+
+        rows.append('Requested: %s operations, estimated cost %s' %
+                    (len(self.requested), estimate_cost(self.requested)))
+        rows.append('Planned: %s operations, estimated cost %s' %
+                    (len(self.planned), estimate_cost(self.planned)))
+        return format_lines(rows)
+
+
+def operation_kind(command, return_response=False):
+    if command.startswith('git checkout '):
+        return CHECKOUT
+    if command.startswith('git push'):
+        return PUSH
+    if command.startswith('git fetch'):
+        return FETCH
+    if return_response:
+        return READ
+    for read_command in READ_COMMANDS:
+        if command.startswith(read_command):
+            return READ
+    return WRITE
+
+
+def is_remote_read(command):
+    for remote_read_command in REMOTE_READ_COMMANDS:
+        if command.startswith(remote_read_command):
+            return True
+    return False
+
+
+def read_on_branch(command, branch_name):
+    if command.startswith('git describe'):
+        return '%s %s' % (command, branch_name)
+    if 'HEAD' not in command or command.startswith(tuple(WORKTREE_READ_COMMANDS)):
+        return command
+
+    tokens = command.split(' ')
+    if command.startswith(('git log', 'git rev-parse')) and 'HEAD' in tokens:
+        return ' '.join(branch_name if token == 'HEAD' else token for token in tokens)
+    raise GitError('Abort: Dry run cannot read "%s" on planned branch %s.' % (command, branch_name))
+
+
+def coalesce_pushes(pushes):
+    refspecs = []
+    for push in pushes:
+        tokens = push.split()
+        if '--set-upstream' in tokens or 'origin' not in tokens:
+            return pushes
+
+        for ref in tokens[tokens.index('origin') + 1:]:
+            if '-f' in tokens:
+                refspecs.append('+' + ref)
+            elif '--delete' in tokens:
+                refspecs.append(':' + ref)
+            else:
+                refspecs.append(ref)
+
+    refs = [refspec.lstrip('+:') for refspec in refspecs]
+    if len(pushes) < 2 or len(set(refs)) != len(refs):
+        return pushes
+    return ['git push --atomic origin %s' % ' '.join(refspecs)]
+
+
+def estimate_cost(operations):
+    return sum(OPERATION_COSTS[kind] for (kind, command) in operations)
+
+
+def run_planned(function, *args, dry_run=False):
+    plan = GitPlan(dry_run)
+    active_plan['plan'] = plan
+    try:
+        try:
+            result = function(*args)
+        except Exception:
+            plan.abort()
+            raise
+        plan.finish()
+    finally:
+        active_plan['plan'] = None
+
+    if dry_run:
+        return plan.describe()
+    return result
@@ -52,7 +52,8 @@ def validate_branch():
 
 
 def validate_sync_with_remote():
-    if 'up-to-date' not in fetch_with_status():
+    status = fetch_with_status()
+    if 'up to date' not in status and 'up-to-date' not in status:
         raise GitError('Abort: Local branch is not synchronised with remote.')
 
 
@@ -71,14 +72,14 @@ def validate_no_unstaged_changes():
 
 
 def validate_no_uncommited_changes():
-    if uncommited_changes != '':
+    if uncommited_changes() != '':
         raise GitError('Abort: ')
 
 
 def tag_exists(tag_name):
     try:
         check_tag_locally(tag_name)
-        if check_tag_remotely(tag_name) != '':
+        if check_tag_remotely(tag_name) == '':
             return False
     except GitError:
         return False
@@ -92,14 +93,15 @@ def validate_dev_test(branch_name):
     if tag_exists(testing_tag(branch_name)):
         raise GitError('Abort: Testing tag already exists.')
     if not branch_name.startswith(HOTFIX) and test_in_progress():
-        checkout(branch_name)
         raise GitError('Abort: Test in progress')
 
 
 def test_in_progress():
-    checkout(DEVELOP)
-    test = get_last_commit_msg()
-    return not check_test_end_keywords(test)
+    return is_test_in_progress(get_last_commit_msg(DEVELOP))
+
+
+def is_test_in_progress(develop_commit_msg):
+    return not check_test_end_keywords(develop_commit_msg)
 
 
 def check_test_end_keywords(test):
@@ -131,6 +133,7 @@ def validate_finish(tag_finished, tag_released):
 
 
 def validate_release(tag_finished, tag_released):
+    validate_branch()
     if tag_exists(tag_released):
         raise GitError('Abort: Branch is already released')
     if not tag_exists(tag_finished):
@@ -175,6 +178,14 @@ def validate_publish(current_branch):
         raise GitError('Abort: Command publish is allowed only on RELEASE and HOTFIX branches')
 
 
+def validate_backport(current_branch, tag_finished):
+    validate_branch()
+    if not current_branch.startswith(HOTFIX):
+        raise GitError('Abort: Command backport is allowed only on HOTFIX branches')
+    if not tag_exists(tag_finished):
+        raise GitError('Abort: Branch is not finished')
+
+
 def validate_version_tag(tag_name):
     if tag_exists(tag_name) is False:
         raise GitError('Fatal: Version %s tag do not exists.' % tag_name)
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if src not in sys.path:
+    sys.path.insert(0, src)
+
+from modules import git_core
+
+
+def git(*args, cwd=None):
+    return subprocess.run(('git',) + args, cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    origin = tmp_path / 'origin.git'
+    work = tmp_path / 'work'
+    git('init', '-q', '--bare', str(origin))
+    git('init', '-q', str(work))
+    git('config', 'user.name', 'corvus', cwd=work)
+    git('config', 'user.email', 'corvus@example.com', cwd=work)
+    git('commit', '-q', '--allow-empty', '-m', 'init', cwd=work)
+    git('branch', '-M', 'DEVELOP', cwd=work)
+    git('remote', 'add', 'origin', str(origin), cwd=work)
+    git('push', '-q', 'origin', 'DEVELOP', cwd=work)
+
+    monkeypatch.chdir(work)
+    monkeypatch.setattr(git_core, 'origin_connection',
+                        {'ssh': None, 'ssh_command': None, 'control_path': None, 'report': False,
+                         'operations': 0, 'handshakes': 0})
+    monkeypatch.setitem(git_core.active_plan, 'plan', None)
+    return work
@@ -0,0 +1,223 @@
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from modules import git_core
+from modules.git_core import add_tag, get_commit_graph_chunks, get_index_extensions, is_origin_command, \
+    is_ssh_url, read_commit_graph_chunks
+from modules.git_flow import large_repo_status
+from modules.git_validation import tag_exists
+from .conftest import git
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SSHD = shutil.which('sshd') or ('/usr/sbin/sshd' if os.path.exists('/usr/sbin/sshd') else None)
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('git@host:repo.git', True),
+    ('host:repo.git', True),
+    ('ssh://host/repo.git', True),
+    ('git+ssh://host/repo.git', True),
+    ('https://host/repo.git', False),
+    ('file:///tmp/repo.git', False),
+    ('/tmp/repo.git', False),
+    ('../dir:with/colon.git', False),
+])
+def test_is_ssh_url(url, expected):
+    assert is_ssh_url(url) is expected
+
+
+def test_is_origin_command():
+    assert is_origin_command('git push -f origin DEVELOP')
+    assert is_origin_command('git ls-remote --tags origin x/started')
+    assert is_origin_command('git fetch')
+    assert not is_origin_command('git remote get-url origin')
+    assert not is_origin_command('git log -1 --pretty=%B DEVELOP')
+
+
+def test_tag_exists_requires_tag_locally_and_on_origin(repo):
+    add_tag('x/started')
+    assert tag_exists('x/started')
+
+    git('tag', 'y/started')
+    assert not tag_exists('y/started')
+    assert not tag_exists('z/started')
+
+
+@pytest.fixture(params=['sha1', 'sha256'])
+def local_repo(tmp_path, monkeypatch, request):
+    git('init', '-q', '--object-format=%s' % request.param, str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    git('config', 'user.name', 'corvus')
+    git('config', 'user.email', 'corvus@example.com')
+    os.mkdir('UNTR')
+    for name in ['linker.c', 'UNTR/link', 'skipped']:
+        with open(name, 'w') as file:
+            file.write(name)
+    git('add', '.')
+    git('commit', '-q', '-m', 'init')
+    return tmp_path
+
+
+@pytest.mark.parametrize('version', [2, 3, 4])
+def test_index_extensions_are_not_guessed_from_paths(local_repo, version):
+    if version == 3:
+        git('update-index', '--skip-worktree', 'skipped')
+    else:
+        git('update-index', '--index-version', str(version))
+
+    (index_version, extensions) = get_index_extensions()
+
+    assert index_version == version
+    assert 'TREE' in extensions
+    assert 'link' not in extensions
+    assert 'UNTR' not in extensions
+
+
+@pytest.mark.parametrize('version', [2, 4])
+def test_index_extensions_report_split_index_and_untracked_cache(local_repo, version):
+    git('update-index', '--index-version', str(version))
+    git('update-index', '--untracked-cache', '--split-index')
+    git('status')
+    assert get_index_extensions()[0] == version
+    assert {'link', 'UNTR'} <= set(get_index_extensions()[1])
+
+    git('update-index', '--no-split-index')
+    assert 'link' not in get_index_extensions()[1]
+
+
+def test_large_repo_status_reads_index_and_commit_graph(local_repo):
+    git('config', 'core.untrackedCache', 'true')
+    git('update-index', '--index-version', '4', '--untracked-cache')
+    git('status')
+    git('commit-graph', 'write', '--reachable', '--changed-paths', '--split')
+
+    status = [line.strip() for line in large_repo_status().splitlines()]
+
+    assert 'untracked cache: active' in status
+    assert 'index v4: active' in status
+    assert 'split index: inactive' in status
+    assert 'commit-graph: active' in status
+    assert 'changed-path Bloom filters: active' in status
+
+
+def test_index_extensions_without_index(tmp_path, monkeypatch):
+    git('init', '-q', str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    assert get_index_extensions() == (0, [])
+
+
+def test_commit_graph_chunks(local_repo):
+    graph_file = os.path.join('.git', 'objects', 'info', 'commit-graph')
+    git('commit-graph', 'write', '--reachable')
+    assert 'CDAT' in read_commit_graph_chunks(graph_file)
+    assert 'BIDX' not in read_commit_graph_chunks(graph_file)
+
+    git('commit-graph', 'write', '--reachable', '--changed-paths')
+    assert {'OIDF', 'OIDL', 'CDAT', 'BIDX', 'BDAT'} <= set(read_commit_graph_chunks(graph_file))
+    assert {'CDAT', 'BIDX'} <= get_commit_graph_chunks()
+
+
+@pytest.fixture
+def ssh_origin(repo, tmp_path, monkeypatch):
+    git('remote', 'set-url', 'origin', 'ssh://git@example.com/origin.git')
+    git('config', 'corvus.sshControlPersist', '5s')
+    monkeypatch.setattr(git_core, 'environ', {'XDG_RUNTIME_DIR': str(tmp_path)})
+    monkeypatch.setattr(git_core, 'register', lambda *args: None)
+    commands = []
+    run_command = git_core.run_command
+
+    def recording_run_command(command, return_response=False):
+        commands.append(command)
+        return run_command(command, return_response)
+
+    monkeypatch.setattr(git_core, 'run_command', recording_run_command)
+    return commands
+
+
+def test_origin_connection_is_not_checked_without_report(ssh_origin):
+    for _ in range(3):
+        git_core.prepare_origin_connection()
+
+    assert git_core.environ['GIT_SSH_COMMAND'].startswith('ssh -o ControlMaster=auto')
+    assert [command for command in ssh_origin if '-O check' in command] == []
+    assert (git_core.origin_connection['operations'], git_core.origin_connection['handshakes']) == (3, 0)
+
+
+def test_origin_connection_check_uses_configured_ssh_command(ssh_origin):
+    git('config', 'core.sshCommand', 'ssh -F /dev/null')
+    git('config', 'corvus.sshReport', 'true')
+    git_core.prepare_origin_connection()
+
+    control_path = git_core.origin_connection['control_path']
+    assert 'ssh -F /dev/null -o ControlPath=%s -O check origin' % control_path in ssh_origin
+    assert git_core.origin_connection['handshakes'] == 1
+
+
+def test_origin_connection_is_not_multiplexed_with_git_ssh(ssh_origin):
+    git_core.environ['GIT_SSH'] = '/usr/bin/ssh'
+    git_core.prepare_origin_connection()
+
+    assert 'GIT_SSH_COMMAND' not in git_core.environ
+    assert git_core.origin_connection['control_path'] is None
+
+
+@pytest.mark.skipif(SSHD is None, reason='sshd is not installed')
+def test_origin_operations_share_one_ssh_handshake(repo, tmp_path, request):
+    port = start_sshd(tmp_path, request)
+    git('remote', 'set-url', 'origin', 'ssh://127.0.0.1:%s%s' % (port, tmp_path / 'origin.git'))
+    git('config', 'core.sshCommand', 'ssh -i %s -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null'
+        % (tmp_path / 'client_key'))
+    git('config', 'corvus.sshReport', 'true')
+
+    assert run_origin_operations() == {'operations': 4, 'handshakes': 1}
+
+    git('config', 'corvus.sshMultiplexing', 'false')
+    assert run_origin_operations() == {'operations': 4, 'handshakes': 4}
+
+
+def run_origin_operations():
+    script = textwrap.dedent("""
+        import sys
+        sys.path.insert(0, %r)
+        from modules import git_core
+        git_core.push_to_origin('DEVELOP')
+        git_core.add_tag('ssh/%%s' %% sys.argv[1])
+        git_core.check_tag_remotely('ssh/%%s' %% sys.argv[1])
+        git_core.fetch_with_status()
+        print(git_core.origin_connection['operations'], git_core.origin_connection['handshakes'])
+    """ % SRC)
+    output = subprocess.run([sys.executable, '-c', script, str(time.time_ns())],
+                            check=True, capture_output=True, text=True).stdout.split()
+    return {'operations': int(output[0]), 'handshakes': int(output[1])}
+
+
+def start_sshd(tmp_path, request):
+    subprocess.run(['ssh-keygen', '-q', '-t', 'ed25519', '-N', '', '-f', str(tmp_path / 'host_key')], check=True)
+    subprocess.run(['ssh-keygen', '-q', '-t', 'ed25519', '-N', '', '-f', str(tmp_path / 'client_key')], check=True)
+    shutil.copy(str(tmp_path / 'client_key.pub'), str(tmp_path / 'authorized_keys'))
+
+    port = 20000 + os.getpid() % 20000
+    config = tmp_path / 'sshd_config'
+    config.write_text(textwrap.dedent("""
+        Port %s
+        ListenAddress 127.0.0.1
+        HostKey %s
+        AuthorizedKeysFile %s
+        PidFile %s
+        StrictModes no
+        UsePAM no
+        PasswordAuthentication no
+    """ % (port, tmp_path / 'host_key', tmp_path / 'authorized_keys', tmp_path / 'sshd.pid')))
+
+    sshd = subprocess.Popen([SSHD, '-D', '-e', '-f', str(config)])
+    request.addfinalizer(sshd.kill)
+    time.sleep(1)
+    if sshd.poll() is not None:
+        pytest.skip('sshd stand-in could not be started')
+    return port
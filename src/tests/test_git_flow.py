@@ -0,0 +1,109 @@
+from json import loads
+
+from modules import git_core, git_plan, git_validation
+from modules.git_flow import backport, flow_status, release
+from modules.git_plan import run_planned
+from .conftest import git
+
+
+def commit_file(content, message):
+    with open('f', 'w') as file:
+        file.write(content + '\n')
+    git('add', 'f')
+    git('commit', '-q', '-m', message)
+
+
+def record_commands(monkeypatch):
+    commands = []
+    run_command = git_core.run_command
+
+    def recording_run_command(command, return_response=False):
+        commands.append(command)
+        return run_command(command, return_response)
+
+    monkeypatch.setattr(git_core, 'run_command', recording_run_command)
+    monkeypatch.setattr(git_plan, 'run_command', recording_run_command)
+    return commands
+
+
+def test_backport_fans_out_to_support_branches(repo, monkeypatch):
+    commit_file('base', 'base')
+    git('branch', 'SUPPORT/a')
+    git('branch', 'SUPPORT/c')
+    git('checkout', '-q', '-b', 'SUPPORT/b')
+    commit_file('support b', 'SUPPORT/b change')
+    git('push', '-q', 'origin', 'DEVELOP', 'SUPPORT/a', 'SUPPORT/b', 'SUPPORT/c')
+    git('worktree', 'add', '-q', str(repo.parent / 'other'), 'SUPPORT/c')
+    support_b = git('rev-parse', 'SUPPORT/b')
+
+    git('checkout', '-q', '-b', 'HOTFIX/h', 'DEVELOP')
+    git('tag', '-a', 'h/started', '-m', 'h/started')
+    commit_file('hotfix', 'HOTFIX/h/fix')
+    git('tag', '-a', 'h/finished', '-m', 'h/finished')
+    git('push', '-q', '--set-upstream', 'origin', 'HOTFIX/h', 'h/started', 'h/finished')
+
+    commands = record_commands(monkeypatch)
+    report = backport([]).splitlines()
+
+    assert report[0].strip() == 'Backport report:'
+    assert report[1].strip() == 'SUPPORT/a: applied (f)'
+    assert report[2].strip().startswith('SUPPORT/b: conflict (')
+    assert report[3].strip().startswith('SUPPORT/c: failed (')
+    assert [command for command in commands if command.startswith('git push')] == ['git push origin SUPPORT/a']
+
+    assert git('log', '-1', '--pretty=%s', 'origin/SUPPORT/a') == 'HOTFIX/h'
+    assert git('show', 'origin/SUPPORT/a:f') == 'hotfix'
+    assert git('ls-remote', 'origin', 'refs/heads/SUPPORT/b').split()[0] == support_b
+    assert git('worktree', 'list').count('\n') == 1
+    assert git('status', '--porcelain') == ''
+
+
+def test_flow_status_lists_local_and_origin_branches(repo):
+    git('commit', '-q', '--allow-empty', '-m', 'FEATURE/a/test - success')
+    git('branch', 'FEATURE/a')
+    git('branch', 'BUGFIX/b')
+    git('push', '-q', 'origin', 'DEVELOP', 'BUGFIX/b', 'DEVELOP:FEATURE/remote')
+    git('fetch', '-q')
+    git('tag', '-a', 'a/started', '-m', 'a/started')
+    git('tag', '-a', 'a/testing', '-m', 'a/testing')
+
+    status = loads(flow_status(True))
+    assert status['branches'] == [
+        {'branch': 'BUGFIX/b', 'state': 'unknown', 'on_develop': False},
+        {'branch': 'FEATURE/a', 'state': 'testing', 'on_develop': False},
+        {'branch': 'FEATURE/remote', 'state': 'unknown', 'on_develop': False}]
+    assert status['develop'] == {'test_in_progress': False, 'test': None, 'last_commit': 'FEATURE/a/test - success'}
+
+    rows = [row.strip() for row in flow_status().splitlines()]
+    assert 'FEATURE/a: testing' in rows
+    assert 'FEATURE/remote: unknown' in rows
+    assert 'DEVELOP: no test in progress' in rows
+
+
+def test_flow_status_agrees_with_test_in_progress(repo):
+    git('branch', 'FEATURE/a')
+    git('commit', '-q', '--allow-empty', '-m', 'FEATURE/a/test')
+    assert loads(flow_status(True))['branches'][0]['on_develop'] is True
+
+    git('commit', '-q', '--allow-empty', '-m', '1.0.1')
+    status = loads(flow_status(True))
+    assert git_validation.test_in_progress()
+    assert status['develop'] == {'test_in_progress': True, 'test': '1.0.1', 'last_commit': '1.0.1'}
+    assert status['branches'][0]['on_develop'] is False
+
+
+def test_release_dry_run_does_not_fetch(repo, monkeypatch):
+    git('branch', 'RELEASE')
+    git('checkout', '-q', '-b', 'FEATURE/a')
+    git('tag', '-a', 'a/started', '-m', 'a/started')
+    commit_file('a', 'FEATURE/a/change')
+    git('tag', '-a', 'a/finished', '-m', 'a/finished')
+    git('push', '-q', '--set-upstream', 'origin', 'RELEASE', 'FEATURE/a', 'a/started', 'a/finished')
+
+    commands = record_commands(monkeypatch)
+    plan = run_planned(release, dry_run=True)
+
+    assert 'git fetch' in plan
+    assert 'git fetch' not in commands
+    assert 'git status' in commands
+    assert [command for command in commands if command.startswith(('git push', 'git tag', 'git commit'))] == []
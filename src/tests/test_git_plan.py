@@ -0,0 +1,216 @@
+import pytest
+
+from modules import git_plan
+from modules.git_core import GitError, WITH_RESPONSE, add_tag, checkout, execute, get_current_branch, \
+    get_last_commit_msg, push_to_origin, remove_tag
+from modules.git_plan import CHECKOUT, FETCH, PUSH, READ, WRITE, GitPlan, coalesce_pushes, operation_kind, \
+    read_on_branch, run_planned
+from .conftest import git
+
+
+class FakeGit:
+    def __init__(self, responses=None, failing=()):
+        self.responses = responses or {}
+        self.failing = failing
+        self.commands = []
+
+    def __call__(self, command, return_response=False):
+        self.commands.append(command)
+        if command in self.failing:
+            raise GitError('fatal: %s' % command)
+        return self.responses.get(command, '')
+
+
+@pytest.fixture
+def fake_git(monkeypatch):
+    fake = FakeGit({'git symbolic-ref --short HEAD': 'FEATURE/a'})
+    monkeypatch.setattr(git_plan, 'run_command', fake)
+    return fake
+
+
+@pytest.mark.parametrize('command, return_response, kind', [
+    ('git checkout DEVELOP', False, CHECKOUT),
+    ('git push -f origin DEVELOP ', False, PUSH),
+    ('git push --delete origin x/testing', False, PUSH),
+    ('git fetch', False, FETCH),
+    ('git describe --abbrev=0 --match=x/started', False, READ),
+    ('git merge HEAD', False, READ),
+    ('git log -1 --pretty=%B DEVELOP', True, READ),
+    ('git commit -m "x"', False, WRITE),
+    ('git tag -a x/started -m "x/started"', False, WRITE),
+])
+def test_operation_kind(command, return_response, kind):
+    assert operation_kind(command, return_response) == kind
+
+
+def test_coalesce_pushes_combines_independent_refs():
+    pushes = ['git push origin x/testing', 'git push -f origin DEVELOP ', 'git push --delete origin x/started']
+    assert coalesce_pushes(pushes) == ['git push --atomic origin x/testing +DEVELOP :x/started']
+
+
+@pytest.mark.parametrize('pushes', [
+    ['git push origin x/testing'],
+    ['git push -f origin FEATURE/x --set-upstream', 'git push origin x/started'],
+    ['git push origin x/testing', 'git push --delete origin x/testing'],
+])
+def test_coalesce_pushes_keeps_dependent_pushes(pushes):
+    assert coalesce_pushes(pushes) == pushes
+
+
+def test_checkouts_are_merged_and_dropped(fake_git):
+    plan = GitPlan()
+    plan.execute('git symbolic-ref --short HEAD', WITH_RESPONSE)
+    plan.execute('git checkout FEATURE/a')
+    plan.execute('git checkout DEVELOP')
+    plan.execute('git checkout RELEASE')
+    plan.execute('git tag -a y -m "y"')
+    plan.execute('git checkout FEATURE/a')
+    plan.finish()
+
+    assert fake_git.commands == ['git symbolic-ref --short HEAD', 'git checkout RELEASE',
+                                 'git tag -a y -m "y"', 'git checkout FEATURE/a']
+
+
+def test_reads_are_cached_until_a_write(fake_git):
+    plan = GitPlan()
+    for _ in range(3):
+        plan.execute('git symbolic-ref --short HEAD', WITH_RESPONSE)
+        plan.execute('git log -1 --pretty=%B', WITH_RESPONSE)
+    plan.execute('git commit -m "x"')
+    plan.execute('git log -1 --pretty=%B', WITH_RESPONSE)
+
+    assert fake_git.commands == ['git symbolic-ref --short HEAD', 'git log -1 --pretty=%B',
+                                 'git commit -m "x"', 'git log -1 --pretty=%B']
+
+
+def test_failed_reads_are_cached(fake_git):
+    fake_git.failing = ('git describe --abbrev=0 --match=x/started',)
+    plan = GitPlan()
+    for _ in range(2):
+        with pytest.raises(GitError):
+            plan.execute('git describe --abbrev=0 --match=x/started')
+
+    assert fake_git.commands == ['git describe --abbrev=0 --match=x/started']
+
+
+def test_head_independent_reads_survive_checkout(fake_git):
+    plan = GitPlan()
+    plan.execute('git log -1 --pretty=%B DEVELOP', WITH_RESPONSE, False)
+    plan.execute('git checkout DEVELOP')
+    plan.execute('git log -1 --pretty=%B DEVELOP', WITH_RESPONSE, False)
+    plan.execute('git log -1 --pretty=%B', WITH_RESPONSE)
+
+    assert fake_git.commands == ['git log -1 --pretty=%B DEVELOP', 'git checkout DEVELOP', 'git log -1 --pretty=%B']
+
+
+def test_push_invalidates_remote_reads(fake_git):
+    plan = GitPlan()
+    plan.execute('git ls-remote --tags origin x', WITH_RESPONSE, False)
+    plan.execute('git ls-remote --tags origin x', WITH_RESPONSE, False)
+    plan.execute('git push origin x')
+    plan.execute('git ls-remote --tags origin x', WITH_RESPONSE, False)
+
+    assert fake_git.commands == ['git ls-remote --tags origin x', 'git push origin x', 'git ls-remote --tags origin x']
+
+
+def test_pushes_are_deferred_and_coalesced(fake_git):
+    plan = GitPlan()
+    plan.execute('git tag -a x -m "x"')
+    plan.execute('git push origin x')
+    plan.execute('git commit -m "y"')
+    plan.execute('git push -f origin DEVELOP ')
+    plan.execute('git log -1 --pretty=%B', WITH_RESPONSE)
+    plan.finish()
+
+    assert fake_git.commands == ['git tag -a x -m "x"', 'git commit -m "y"', 'git log -1 --pretty=%B',
+                                 'git push --atomic origin x +DEVELOP']
+
+
+def test_tag_writes_flush_earlier_pushes(fake_git):
+    plan = GitPlan()
+    plan.execute('git tag -a x -m "x"')
+    plan.execute('git push origin x')
+    plan.execute('git commit -m "y"')
+    plan.execute('git push origin DEVELOP')
+    plan.execute('git tag -d z')
+    plan.execute('git push --delete origin z')
+    plan.finish()
+
+    assert fake_git.commands == ['git tag -a x -m "x"', 'git commit -m "y"', 'git push --atomic origin x DEVELOP',
+                                 'git tag -d z', 'git push --delete origin z']
+
+
+def test_read_on_branch():
+    assert read_on_branch('git log -1 --pretty=%B HEAD', 'RELEASE') == 'git log -1 --pretty=%B RELEASE'
+    assert read_on_branch('git rev-parse --verify HEAD', 'RELEASE') == 'git rev-parse --verify RELEASE'
+    assert read_on_branch('git describe --abbrev=0 --match=x', 'RELEASE') == 'git describe --abbrev=0 --match=x RELEASE'
+    assert read_on_branch('git diff-index --cached --ignore-submodules HEAD --', 'RELEASE') == \
+        'git diff-index --cached --ignore-submodules HEAD --'
+    with pytest.raises(GitError):
+        read_on_branch('git show HEAD', 'RELEASE')
+
+
+def test_failing_flow_still_pushes_completed_steps(repo):
+    def flow():
+        execute('git commit --allow-empty -m "step"')
+        push_to_origin('DEVELOP')
+        add_tag('y/testing')
+        execute('git apply --index --check missing.patch')
+        get_current_branch()
+
+    with pytest.raises(GitError):
+        run_planned(flow)
+
+    assert git('ls-remote', 'origin', 'refs/heads/DEVELOP').split()[0] == git('rev-parse', 'DEVELOP')
+    assert git('ls-remote', '--tags', 'origin', 'y/testing') != ''
+
+
+def test_failing_write_drops_later_pushes(repo):
+    def flow():
+        add_tag('a/testing')
+        execute('git bogus-command')
+        add_tag('b/testing')
+        get_current_branch()
+
+    with pytest.raises(GitError):
+        run_planned(flow)
+
+    assert git('ls-remote', '--tags', 'origin', 'a/testing') != ''
+    assert git('ls-remote', '--tags', 'origin', 'b/testing') == ''
+    assert git('tag', '--list', 'b/testing') == ''
+
+
+def test_rejected_push_keeps_later_local_tags(repo):
+    git('tag', '-a', 'a/finished', '-m', 'a/finished')
+
+    def flow():
+        push_to_origin('MISSING')
+        remove_tag('a/finished')
+        add_tag('a/released')
+        get_current_branch()
+
+    with pytest.raises(GitError):
+        run_planned(flow)
+
+    assert git('tag', '--list') == 'a/finished'
+
+
+def test_dry_run_reads_head_from_planned_branch(repo):
+    git('checkout', '-q', '-b', 'RELEASE')
+    git('commit', '-q', '--allow-empty', '-m', 'release msg')
+    git('checkout', '-q', 'DEVELOP')
+    messages = []
+
+    def flow():
+        get_current_branch()
+        checkout('RELEASE')
+        messages.append(get_last_commit_msg().rstrip())
+        add_tag('x/released')
+
+    plan = run_planned(flow, dry_run=True)
+
+    assert messages == ['release msg']
+    assert git('symbolic-ref', '--short', 'HEAD') == 'DEVELOP'
+    assert git('tag', '--list') == ''
+    assert 'git checkout RELEASE' in plan
+    assert 'git log -1 --pretty=%B RELEASE' in plan